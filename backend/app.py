@@ -1,5 +1,8 @@
-import io
-from flask import Flask, render_template, request, jsonify, send_file
+import asyncio
+import hashlib
+import re
+from contextlib import AsyncExitStack
+from quart import Quart, Response, render_template, request, jsonify
 import os
 from config import (
     OPENAI_API_KEY,
@@ -7,16 +10,23 @@ from config import (
     OPENAI_CHAT_MODEL,
     CHROMA_API_KEY,
     CHROMA_TENANT,
-    CHROMA_DATABASE
+    CHROMA_DATABASE,
+    REDIS_URL
 )
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI
 import chromadb
-import json
+import orjson
+import numpy as np
+import redis
+from redis import asyncio as aioredis
+import ahocorasick
+from langdetect import detect_langs, DetectorFactory, LangDetectException
 
 #########################################################
-####### Initialize Flask app and ChromaDB client ########
+####### Initialize Quart app and ChromaDB client ########
 #########################################################
-app = Flask(__name__, static_folder="static", template_folder="templates")
+app = Quart(__name__, static_folder="static", template_folder="templates")
 
 client = chromadb.CloudClient(
     api_key=CHROMA_API_KEY,
@@ -24,24 +34,358 @@ client = chromadb.CloudClient(
     database=CHROMA_DATABASE
 )
 collection = client.get_or_create_collection(name="book_chunks")
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
+
+# Build the sorted list of available themes from the collection metadata
+def load_themes() -> list:
+    """
+    Returns all themes stored in the collection metadata, sorted and deduplicated.
+    Themes are stored by the ingest script as a comma-separated string per chunk.
+    """
+    metadatas = collection.get(include=["metadatas"])["metadatas"]
+    return sorted({t for meta in metadatas for t in meta.get("themes", "").split(", ") if t})
+
+# Themes only change when the ingest script runs, so compute them once at startup
+THEMES = load_themes()
+
+# Shared HTTP/2 connection pool, so bursts of OpenAI calls reuse warm TLS connections
+_http = httpx.AsyncClient(
+    http2=True,
+    timeout=httpx.Timeout(60.0, connect=10.0),
+    limits=httpx.Limits(max_keepalive_connections=20, max_connections=40)
+)
+openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=_http)
+# Redis is optional: without REDIS_URL the answer cache is disabled.
+# Short timeouts make an unresponsive Redis fail fast instead of stalling every request.
+redis_client = aioredis.from_url(
+    REDIS_URL,
+    socket_connect_timeout=0.3,
+    socket_timeout=0.3
+) if REDIS_URL else None
+
+#########################################################
+################ Answer Cache (Redis) ###################
+#########################################################
+# Cached answers expire after one hour
+ASK_CACHE_TTL = 3600
+# Maximum cosine distance for a cached question to count as the same question
+ASK_CACHE_MAX_DISTANCE = 0.1
+# RediSearch index over the cached question embeddings
+ASK_CACHE_INDEX = "idx:ask:v1"
+ASK_CACHE_VECTOR_PREFIX = "askvec:v1:"
+
+def _cache_hash(question: str) -> str:
+    """
+    Returns the sha256 hex digest of the normalized question (lowercase, collapsed whitespace).
+    """
+    normalized = " ".join(question.lower().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+async def get_cached_answer(question: str, language: str):
+    """
+    Returns the cached answer for an exact (normalized) question match, or None.
+    """
+    if redis_client is None:
+        return None
+    try:
+        cached = await redis_client.get(f"ask:v1:{_cache_hash(question)}:{language}")
+        return orjson.loads(cached) if cached else None
+    except redis.RedisError:
+        return None
+
+# Set once the vector index is known to exist, so it is only created once per worker
+_ask_cache_index_ready = False
+
+async def _ensure_ask_cache_index(dim: int) -> None:
+    """
+    Creates the vector index used for near-duplicate lookups on first use.
+    An index created meanwhile by another worker counts as success.
+    """
+    global _ask_cache_index_ready
+    if _ask_cache_index_ready:
+        return
+    try:
+        await redis_client.execute_command(
+            "FT.CREATE", ASK_CACHE_INDEX, "ON", "HASH", "PREFIX", 1, ASK_CACHE_VECTOR_PREFIX,
+            "SCHEMA", "language", "TAG",
+            "embedding", "VECTOR", "HNSW", 6, "TYPE", "FLOAT32", "DIM", dim, "DISTANCE_METRIC", "COSINE"
+        )
+    except redis.ResponseError as e:
+        if "already exists" not in str(e).lower():
+            raise
+    _ask_cache_index_ready = True
+
+async def find_similar_answer(embedding, language: str):
+    """
+    Returns the cached answer of the nearest previously answered question in the same language,
+    if its cosine distance is below ASK_CACHE_MAX_DISTANCE. Requires Redis Stack (RediSearch).
+    """
+    if redis_client is None:
+        return None
+    language_tag = re.sub(r"(\W)", r"\\\1", language)
+    try:
+        response = await redis_client.execute_command(
+            "FT.SEARCH", ASK_CACHE_INDEX,
+            f"(@language:{{{language_tag}}})=>[KNN 1 @embedding $vec AS distance]",
+            "PARAMS", 2, "vec", np.asarray(embedding, dtype=np.float32).tobytes(),
+            "SORTBY", "distance", "RETURN", 2, "distance", "payload",
+            "LIMIT", 0, 1, "DIALECT", 2
+        )
+    except redis.RedisError:
+        return None
+    # Response layout: [total, key, [field, value, ...]]
+    if not response or response[0] == 0:
+        return None
+    fields = dict(zip(response[2][::2], response[2][1::2]))
+    if float(fields[b"distance"]) >= ASK_CACHE_MAX_DISTANCE:
+        return None
+    return orjson.loads(fields[b"payload"])
+
+async def cache_answer(question: str, language: str, embedding, result: dict) -> None:
+    """
+    Stores the answer under the exact question key and in the vector index, both with ASK_CACHE_TTL.
+    """
+    if redis_client is None:
+        return
+    question_hash = _cache_hash(question)
+    payload = orjson.dumps(result)
+    try:
+        await redis_client.set(f"ask:v1:{question_hash}:{language}", payload, ex=ASK_CACHE_TTL)
+        await _ensure_ask_cache_index(len(embedding))
+        vector_key = f"{ASK_CACHE_VECTOR_PREFIX}{question_hash}:{language}"
+        async with redis_client.pipeline() as pipe:
+            pipe.hset(vector_key, mapping={
+                "language": language,
+                "embedding": np.asarray(embedding, dtype=np.float32).tobytes(),
+                "payload": payload
+            })
+            pipe.expire(vector_key, ASK_CACHE_TTL)
+            await pipe.execute()
+    except redis.RedisError:
+        pass
+
+#########################################################
+################## Embedding Batcher ####################
+#########################################################
+# Concurrent embedding requests are coalesced into one OpenAI call
+# when they arrive within EMBED_MAX_WAIT seconds of each other
+EMBED_MAX_BATCH = 32
+EMBED_MAX_WAIT = 0.025
+
+_embed_queue = None
+_embed_worker = None
+# Keep references to in-flight flushes so they are not garbage collected
+_embed_flushes = set()
+
+async def embed(text: str) -> list:
+    """
+    Returns the embedding of the text, batched together with other concurrent callers.
+    """
+    future = asyncio.get_running_loop().create_future()
+    await _embed_queue.put((text, future))
+    return await future
+
+async def _flush_embeddings(batch: list) -> None:
+    """
+    Embeds a batch of (text, future) pairs in a single request and resolves each future.
+    """
+    try:
+        response = await openai_client.embeddings.create(
+            model=OPENAI_EMBEDDING_MODEL,
+            input=[text for text, _ in batch]
+        )
+        # response.data keeps the order of the input list
+        for (_, future), item in zip(batch, response.data):
+            if not future.done():
+                future.set_result(item.embedding)
+        # zip() stops at the shorter list, so fail anyone the response did not cover
+        for _, future in batch[len(response.data):]:
+            if not future.done():
+                future.set_exception(RuntimeError("missing embedding"))
+    except Exception as e:
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(e)
+
+async def _embedding_batch_loop() -> None:
+    """
+    Collects queued texts until EMBED_MAX_BATCH is reached or EMBED_MAX_WAIT has elapsed,
+    then flushes them without waiting for the request to finish.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await _embed_queue.get()]
+        deadline = loop.time() + EMBED_MAX_WAIT
+        while len(batch) < EMBED_MAX_BATCH:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(_embed_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        task = asyncio.create_task(_flush_embeddings(batch))
+        _embed_flushes.add(task)
+        task.add_done_callback(_embed_flushes.discard)
+
+# Cached question embeddings expire after 30 days
+EMBEDDING_CACHE_TTL = 30 * 86400
+
+async def get_embedding(text: str) -> np.ndarray:
+    """
+    Returns the embedding of the text as a float32 array, served from Redis when it was computed before.
+    Embeddings are stored as float32 bytes, keyed by model and sha256 of the text.
+    """
+    key = f"emb:v1:{OPENAI_EMBEDDING_MODEL}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+    if redis_client is not None:
+        try:
+            cached = await redis_client.get(key)
+            if cached:
+                return np.frombuffer(cached, dtype=np.float32)
+        except redis.RedisError:
+            pass
+    embedding = np.asarray(await embed(text), dtype=np.float32)
+    if redis_client is not None:
+        try:
+            await redis_client.set(key, embedding.tobytes(), ex=EMBEDDING_CACHE_TTL)
+        except redis.RedisError:
+            pass
+    return embedding
+
+@app.before_serving
+async def start_embedding_batcher():
+    """
+    Starts the embedding batcher on the server's event loop.
+    """
+    global _embed_queue, _embed_worker
+    _embed_queue = asyncio.Queue()
+    _embed_worker = asyncio.create_task(_embedding_batch_loop())
+
+@app.after_serving
+async def stop_embedding_batcher():
+    """
+    Stops the embedding batcher and closes the OpenAI connection pool when the server shuts down.
+    """
+    _embed_worker.cancel()
+    await _http.aclose()
+
+#########################################################
+################## Language Detection ###################
+#########################################################
+# Make langdetect deterministic across requests
+DetectorFactory.seed = 0
+
+# ISO 639-1 codes returned by langdetect -> language names used in the prompts
+LANGNAME_MAP = {
+    "en": "English",
+    "ro": "Romanian",
+    "fr": "French",
+    "de": "German",
+    "es": "Spanish",
+    "it": "Italian",
+    "pt": "Portuguese",
+    "nl": "Dutch",
+    "pl": "Polish",
+    "hu": "Hungarian",
+    "ru": "Russian",
+    "uk": "Ukrainian",
+    "bg": "Bulgarian",
+    "el": "Greek",
+    "tr": "Turkish",
+    "sv": "Swedish",
+    "cs": "Czech"
+}
+
+# Explicit language requests accepted by /summary -> language name
+LANGUAGE_PHRASES = {
+    "in limba romana": "Romanian",
+    "în română": "Romanian",
+    "in romanian": "Romanian",
+    "in english": "English",
+    "en français": "French",
+    "auf deutsch": "German"
+}
+# Matches any of the language phrases above in a single case-insensitive pass
+_LANG_RE = re.compile("|".join(re.escape(x) for x in LANGUAGE_PHRASES), re.I)
+
+# langdetect is unreliable on very short text ("tell me more" -> Italian) even at high probability,
+# so shorter texts and uncertain results are left to the fallback
+LANGDETECT_MIN_WORDS = 4
+LANGDETECT_MIN_PROBABILITY = 0.8
+
+def detect_language_locally(text: str):
+    """
+    Detects the language of the text with langdetect.
+    Returns None when langdetect cannot decide reliably: the text has fewer than
+    LANGDETECT_MIN_WORDS words or the top probability is below LANGDETECT_MIN_PROBABILITY.
+    """
+    if len(text.split()) < LANGDETECT_MIN_WORDS:
+        return None
+    try:
+        best = detect_langs(text)[0]
+    except LangDetectException:
+        return None
+    if best.prob < LANGDETECT_MIN_PROBABILITY:
+        return None
+    return LANGNAME_MAP.get(best.lang, "English")
+
+async def detect_language(text: str, fallback_prompt: str) -> str:
+    """
+    Detects the language of the text locally with langdetect.
+    Only when langdetect cannot decide reliably (e.g. very short input) is OpenAI asked, using fallback_prompt.
+    """
+    language = detect_language_locally(text)
+    if language is None:
+        lang_response = await openai_client.chat.completions.create(
+            model=OPENAI_CHAT_MODEL,
+            messages=[{"role": "user", "content": fallback_prompt}]
+        )
+        language = lang_response.choices[0].message.content.strip()
+    return language
 
 #########################################################
 ################## Get Book Summary #####################
 #########################################################
+# Load book summaries once at import, indexed by lowercase title
+BOOKS_JSON_PATH = os.path.join(os.path.dirname(__file__), '../data/book_summaries.json')
+with open(BOOKS_JSON_PATH, 'rb') as f:
+    _BOOKS = orjson.loads(f.read())
+_BY_TITLE = {book['title'].lower(): book for book in _BOOKS}
+_TITLES = [book['title'] for book in _BOOKS]
+# Aho-Corasick automaton over the titles, to find every mentioned title in one pass
+_TITLE_AUTOMATON = ahocorasick.Automaton()
+for _title in _TITLES:
+    _TITLE_AUTOMATON.add_word(_title, _title)
+_TITLE_AUTOMATON.make_automaton()
+
+def find_mentioned_titles(text: str) -> list:
+    """
+    Returns the book titles mentioned in the text, in order of position.
+    Matching is case-sensitive and only accepts whole words, so a title inside
+    another word or ordinary lowercase prose (e.g. "dunes", "the road") is not a mention.
+    """
+    if not _TITLES:
+        return []
+    mentioned = []
+    for end, title in _TITLE_AUTOMATON.iter(text):
+        start = end - len(title) + 1
+        if start > 0 and text[start - 1].isalnum():
+            continue
+        if end + 1 < len(text) and text[end + 1].isalnum():
+            continue
+        mentioned.append(title)
+    return mentioned
+
 # Get the summary of a book by its title
 # Use /summary <book_title> in the chat 
 def get_summary_by_title(title: str) -> str:
     """
     Returns the summary for a given book title from book_summaries.json.
-    Searches the JSON file for a book with the specified title (case-insensitive).
+    Looks the title up (case-insensitive) in the summaries loaded at import.
     Returns the summary if found, otherwise a not-found message.
     """
-    with open(os.path.join(os.path.dirname(__file__), '../data/book_summaries.json'), encoding='utf-8') as f:
-        books = json.load(f)
-    for book in books:
-        if book['title'].lower() == title.lower():
-            return book['summary']
+    book = _BY_TITLE.get(title.lower())
+    if book:
+        return book['summary']
     return f"No summary found for title: {title}"
 
 # Register tool for OpenAI function calling
@@ -66,143 +410,222 @@ openai_tools = [
 ################### Main Chat UI ########################
 #########################################################
 @app.route("/")
-def index():
+async def index():
     """
     Renders the main chat UI page.
     """
-    return render_template("index.html")
+    return await render_template("index.html")
 
-@app.route("/ask", methods=["POST"])
-def ask():
+# Requests for an image alongside the answer
+_IMAGE_RE = re.compile(r"image|picture|draw|generate an image|show me a picture", re.I)
+
+# Follow-up questions refer back to the conversation (English and Romanian pronouns/references)
+_FOLLOWUP_RE = re.compile(
+    r"\b(it|this|that|he|she|they|them|the (book|author)|el|ea|ei|ele|asta|aceasta|această|acesta|cartea|autorul"
+    r"|more|else|another|other|similar|mai|alta|altă|alte|altceva)\b",
+    re.I
+)
+# Questions this short are elliptical ("what else?", "any other books?") and rely on the history
+FOLLOWUP_MAX_WORDS = 4
+
+def needs_rewrite(question: str, history: list) -> bool:
     """
-    Main chat endpoint. Handles user questions and returns chatbot responses.
-    - If the question starts with '/summary', returns a book summary (optionally translated).
-    - Otherwise, performs RAG search and generates an answer using OpenAI and ChromaDB.
-    - Handles polite fallback if no book matches are found.
-    - Supports image generation and TTS features.
+    Returns True when the question depends on the conversation history and must be
+    reformulated as a standalone question: it uses a pronoun/reference or is very short.
+    """
+    if not history:
+        return False
+    return bool(_FOLLOWUP_RE.search(question)) or len(question.split()) <= FOLLOWUP_MAX_WORDS
+
+# Pre-translated replies for when no book matches the question
+POLITE_TEMPLATES = {
+    "English": "Sorry, I couldn't find a suitable book for this topic. I only have access to the books in my own library. Available themes: {themes}.",
+    "Romanian": "Îmi pare rău, nu am găsit nicio carte potrivită pentru acest subiect. Am acces doar la cărțile din propria mea bibliotecă. Teme disponibile: {themes}.",
+    "French": "Désolé, je n'ai trouvé aucun livre adapté à ce sujet. Je n'ai accès qu'aux livres de ma propre bibliothèque. Thèmes disponibles : {themes}.",
+    "German": "Entschuldigung, ich konnte kein passendes Buch zu diesem Thema finden. Ich habe nur Zugriff auf die Bücher in meiner eigenen Bibliothek. Verfügbare Themen: {themes}.",
+    "Spanish": "Lo siento, no he encontrado ningún libro adecuado para este tema. Solo tengo acceso a los libros de mi propia biblioteca. Temas disponibles: {themes}.",
+    "Italian": "Mi dispiace, non ho trovato nessun libro adatto a questo argomento. Ho accesso solo ai libri della mia biblioteca. Temi disponibili: {themes}."
+}
+
+async def get_standalone_question(question: str, history: list) -> str:
+    """
+    Returns the question rewritten as a standalone question when it depends on the history.
+    Otherwise the question is returned unchanged, without calling OpenAI.
+    """
+    # Reformulate the question using LLM only if it looks like a follow-up to the history
+    if not needs_rewrite(question, history):
+        return question
+    # Use conversation history to create a standalone question
+    messages = history + [
+        {"role": "user", "content": f"Reformulate the following question as a standalone question, using the context of the conversation: {question}"}
+    ]
+    response = await openai_client.chat.completions.create(
+        model=OPENAI_CHAT_MODEL,
+        messages=messages
+    )
+    return response.choices[0].message.content.strip()
+
+async def present_summary(question: str, title: str, summary: str, desired_language) -> str:
+    """
+    Returns the summary in the desired language with a single chat completion.
+    The summary is passed as the result of a get_summary_by_title tool call, so the model only
+    has to answer the user in the right language. If desired_language is None, the model also
+    decides which language the user asked for.
+    """
+    if desired_language:
+        language_instruction = f"Respond in {desired_language}."
+    else:
+        language_instruction = "Respond in the language the user asked for, or else in the language of the request."
+    messages = [
+        {"role": "system", "content": f"Give the user the book summary returned by the tool, translated faithfully, without adding anything else. {language_instruction}"},
+        {"role": "user", "content": question},
+        {"role": "assistant", "content": None, "tool_calls": [{
+            "id": "call_get_summary",
+            "type": "function",
+            "function": {"name": "get_summary_by_title", "arguments": orjson.dumps({"title": title}).decode()}
+        }]},
+        {"role": "tool", "tool_call_id": "call_get_summary", "content": summary}
+    ]
+    response = await openai_client.chat.completions.create(
+        model=OPENAI_CHAT_MODEL,
+        messages=messages,
+        tools=openai_tools,
+        tool_choice="none"
+    )
+    return response.choices[0].message.content.strip()
+
+async def answer_summary(question: str, history: list) -> dict:
+    """
+    Handles '/summary <book_title>' requests.
+    Returns the book summary (optionally translated). If no title is given, or only a language
+    is requested, the last book title mentioned by the assistant in the history is used.
+    """
+    request_text = question.strip()[len("/summary"):].strip()
+    # An explicit language phrase decides the output language
+    language_match = _LANG_RE.search(request_text)
+    language_phrase = language_match.group(0).lower() if language_match else None
+    # Remove language request from title (for clarity)
+    title = _LANG_RE.sub("", request_text).strip()
+    # If title is empty or only contains a language phrase, extract last book title from history
+    if not title or language_phrase:
+        last_title = None
+        # Search for last mentioned book title in previous bot responses
+        for entry in reversed(history):
+            if entry.get('role') == 'assistant':
+                # Matches are in order of position, so the last one was mentioned last
+                mentioned = find_mentioned_titles(entry.get('content', ''))
+                if mentioned:
+                    last_title = mentioned[-1]
+                    break
+        title = last_title if last_title else ""
+    summary = get_summary_by_title(title) if title else "No book title found in previous answers."
+    # Detect desired output language, locally whenever possible
+    if language_phrase:
+        desired_language = LANGUAGE_PHRASES[language_phrase]
+    elif title and not summary.startswith("No summary found"):
+        # The request only named a known book, so no other language was asked for
+        desired_language = "English"
+    else:
+        # None: left to the model, which sees the request alongside the summary
+        desired_language = detect_language_locally(request_text or question)
+    # Translate to desired language if needed
+    needs_translation = desired_language is None or desired_language.lower() not in ["english", "en"]
+    if needs_translation and summary and not summary.startswith("No book title"):
+        summary = await present_summary(question, title, summary, desired_language)
+    return {"answer": summary, "context": ""}
+
+async def prepare_answer(question: str, history: list) -> dict:
+    """
+    Runs the chat pipeline up to the final answer generation.
+    Returns {"result": ...} when the response is already known (summary, cached answer, no match).
+    Otherwise returns the prompt for the final completion and the state needed to finish the answer.
     """
-    data = request.json
-    question = data.get("question", "")
-    history = data.get("history", [])
     # If user writes '/summary', call the summary tool
     if question.strip().startswith("/summary"):
-        # Use OpenAI to detect desired output language
-        lang_detect_prompt = f"What language does the user want the answer in? Respond only with the language name.\n\nUser request: {question}"
-        lang_response = openai_client.chat.completions.create(
-            model=OPENAI_CHAT_MODEL,
-            messages=[{"role": "user", "content": lang_detect_prompt}]
-        )
-        desired_language = lang_response.choices[0].message.content.strip()
-        title = question.strip()[len("/summary"):].strip()
-        # Remove language request from title (for clarity)
-        language_phrases = ["in limba romana", "în română", "in romanian", "in english", "en français", "auf deutsch"]
-        for x in language_phrases:
-            if x in title.lower():
-                title = title.lower().replace(x, "").strip()
-        # If title is empty or only contains a language phrase, extract last book title from history
-        if not title or any(x in question.lower() for x in language_phrases):
-            last_title = None
-            # Search for last mentioned book title in previous bot responses
-            with open(os.path.join(os.path.dirname(__file__), '../data/book_summaries.json'), encoding='utf-8') as f:
-                books = json.load(f)
-                book_titles = [book['title'] for book in books]
-            for entry in reversed(history):
-                if entry.get('role') == 'assistant':
-                    mentioned = [t for t in book_titles if t in entry.get('content', '')]
-                    if mentioned:
-                        last_title = mentioned[-1]
-                        break
-            title = last_title if last_title else ""
-        summary = get_summary_by_title(title) if title else "No book title found in previous answers."
-        # Translate to desired language if needed
-        if desired_language.lower() not in ["english", "en"] and summary and not summary.startswith("No book title"):
-            translate_prompt = f"Translate the following book summary to {desired_language}:\n\n{summary}"
-            response = openai_client.chat.completions.create(
-                model=OPENAI_CHAT_MODEL,
-                messages=[{"role": "user", "content": translate_prompt}]
-            )
-            summary = response.choices[0].message.content.strip()
-        return jsonify({"answer": summary, "context": ""})
-    # Detect the language of the question using OpenAI
+        return {"result": await answer_summary(question, history)}
+    # Detect the language of the question (OpenAI is only used as a fallback)
     lang_prompt = f"What language is used in the following text? Answer only with the language name.\n\nText: {question}"
-    lang_response = openai_client.chat.completions.create(
-        model=OPENAI_CHAT_MODEL,
-        messages=[{"role": "user", "content": lang_prompt}]
+    # Language detection and question reformulation are independent, so run them concurrently
+    user_language, standalone_question = await asyncio.gather(
+        detect_language(question, lang_prompt),
+        get_standalone_question(question, history)
     )
-    user_language = lang_response.choices[0].message.content.strip()
-    data = request.json
-    question = data.get("question", "")
-    history = data.get("history", [])
-    # Reformulate the question using LLM if there is history
-    if history:
-        # Use conversation history to create a standalone question
-        messages = history + [
-            {"role": "user", "content": f"Reformulate the following question as a standalone question, using the context of the conversation: {question}"}
-        ]
-        response = openai_client.chat.completions.create(
-            model=OPENAI_CHAT_MODEL,
-            messages=messages
-        )
-        standalone_question = response.choices[0].message.content.strip()
-    else:
-        standalone_question = question
-    # Get embedding for the question using OpenAI
-    embedding = openai_client.embeddings.create(model=OPENAI_EMBEDDING_MODEL, input=[standalone_question]).data[0].embedding
-    # Query ChromaDB for relevant book chunks
-    results = collection.query(
-        query_embeddings=[embedding],
+    # The cache key holds nothing from the conversation, so only questions that stand on their own
+    # (no history, or rewritten as a standalone question) may be served from or stored in the cache
+    use_cache = not history or needs_rewrite(question, history)
+    # Return the cached answer if this exact question was answered recently
+    cached = await get_cached_answer(standalone_question, user_language) if use_cache else None
+    if cached:
+        return {"result": cached}
+    # Get embedding for the question (cached in Redis, otherwise batched with concurrent requests)
+    embedding = await get_embedding(standalone_question)
+    # Return the cached answer of a near-duplicate question, if any
+    cached = await find_similar_answer(embedding, user_language) if use_cache else None
+    if cached:
+        return {"result": cached}
+    # Query ChromaDB for relevant book chunks (the Chroma client is blocking, so run it in a thread)
+    results = await asyncio.to_thread(
+        collection.query,
+        query_embeddings=embedding.reshape(1, -1),
         n_results=3,
         include=["documents", "metadatas"]
     )
     # If no match is found, respond politely and list available themes
     if not results["documents"] or not results["documents"][0]:
-        # Extract themes from ChromaDB (from metadatas)
-        all_metadatas = collection.get()["metadatas"]
-        themes = set()
-        for meta in all_metadatas:
-            if "themes" in meta:
-                themes.update(meta["themes"])
-        theme_list = sorted(list(themes))
-        # Prompt for generating a polite response in the user's language
-        polite_prompt = (
-            f"Respond politely in {user_language} as a chatbot that did not find any suitable book for the requested topic. Explicitly state that you only have access to books in your database. Do not mention book titles! List only the available themes.\n\n"
-            f"Question: {question}\n"
-            f"Available themes: {', '.join(theme_list)}"
-        )
-        polite_response = openai_client.chat.completions.create(
-            model=OPENAI_CHAT_MODEL,
-            messages=[{"role": "user", "content": polite_prompt}]
-        )
-        polite_answer = polite_response.choices[0].message.content.strip()
-        return jsonify({
+        # Themes were loaded from ChromaDB metadata at startup
+        theme_list = THEMES
+        if user_language in POLITE_TEMPLATES:
+            polite_answer = POLITE_TEMPLATES[user_language].format(themes=", ".join(theme_list))
+        else:
+            # Prompt for generating a polite response in a language without a template
+            polite_prompt = (
+                f"Respond politely in {user_language} as a chatbot that did not find any suitable book for the requested topic. Explicitly state that you only have access to books in your database. Do not mention book titles! List only the available themes.\n\n"
+                f"Question: {question}\n"
+                f"Available themes: {', '.join(theme_list)}"
+            )
+            polite_response = await openai_client.chat.completions.create(
+                model=OPENAI_CHAT_MODEL,
+                messages=[{"role": "user", "content": polite_prompt}]
+            )
+            polite_answer = polite_response.choices[0].message.content.strip()
+        return {"result": {
             "answer": polite_answer,
             "context": "",
             "themes": theme_list
-        })
+        }}
     # Build context from ChromaDB results
     context = "\n".join(results["documents"][0])
     # If context is empty, do not generate a recommendation
     if not context.strip():
-        return jsonify({
+        return {"result": {
             "answer": "",
             "context": ""
-        })
+        }}
     # Generate answer with LLM, forcing it to use ONLY the context
     prompt = (
         f"Use only the information from the context below to answer the question. Do not invent titles or information that does not appear in the context. Answer in {user_language}.\n\nContext:\n{context}\n\nQuestion: {standalone_question}\nAnswer:"
     )
-    response = openai_client.chat.completions.create(
-        model=OPENAI_CHAT_MODEL,
-        messages=[{"role": "user", "content": prompt}]
-    )
-    answer = response.choices[0].message.content.strip()
+    return {
+        "prompt": prompt,
+        "context": context,
+        "question": question,
+        "standalone_question": standalone_question,
+        "user_language": user_language,
+        "embedding": embedding,
+        "use_cache": use_cache
+    }
+
+async def finish_answer(plan: dict, answer: str) -> dict:
+    """
+    Builds the final response for a generated answer, adds the requested image and caches it.
+    """
     # Check if the user requested an image
-    image_keywords = ["image", "picture", "draw", "generate an image", "show me a picture"]
+    question = plan["question"]
     image_url = None
-    if any(kw.lower() in question.lower() for kw in image_keywords):
+    if _IMAGE_RE.search(question):
         try:
             # Generate image using OpenAI DALL-E
-            img_response = openai_client.images.generate(
+            img_response = await openai_client.images.generate(
                 model="dall-e-3",
                 prompt=question,
                 n=1,
@@ -211,24 +634,77 @@ def ask():
             image_url = img_response.data[0].url
         except Exception as e:
             image_url = None
-    result = {"answer": answer, "context": context}
+    result = {"answer": answer, "context": plan["context"]}
     if image_url:
         result["image_url"] = image_url
-    return jsonify(result)
+    if plan["use_cache"]:
+        await cache_answer(plan["standalone_question"], plan["user_language"], plan["embedding"], result)
+    return result
+
+@app.route("/ask", methods=["POST"])
+async def ask():
+    """
+    Main chat endpoint. Handles user questions and returns chatbot responses.
+    - If the question starts with '/summary', returns a book summary (optionally translated).
+    - Otherwise, performs RAG search and generates an answer using OpenAI and ChromaDB.
+    - Handles polite fallback if no book matches are found.
+    - Supports image generation and TTS features.
+    """
+    data = await request.get_json()
+    plan = await prepare_answer(data.get("question", ""), data.get("history", []))
+    if "result" in plan:
+        return jsonify(plan["result"])
+    response = await openai_client.chat.completions.create(
+        model=OPENAI_CHAT_MODEL,
+        messages=[{"role": "user", "content": plan["prompt"]}]
+    )
+    answer = response.choices[0].message.content.strip()
+    return jsonify(await finish_answer(plan, answer))
+
+@app.route("/ask_stream", methods=["POST"])
+async def ask_stream():
+    """
+    Streaming variant of /ask. Returns newline-delimited JSON:
+    {"delta": ...} lines with the answer text as it is generated,
+    followed by one {"result": ...} line with the same response /ask would return.
+    """
+    data = await request.get_json()
+    plan = await prepare_answer(data.get("question", ""), data.get("history", []))
+
+    async def generate():
+        if "result" in plan:
+            yield orjson.dumps({"delta": plan["result"]["answer"]}) + b"\n"
+            yield orjson.dumps({"result": plan["result"]}) + b"\n"
+            return
+        stream = await openai_client.chat.completions.create(
+            model=OPENAI_CHAT_MODEL,
+            messages=[{"role": "user", "content": plan["prompt"]}],
+            stream=True
+        )
+        parts = []
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                yield orjson.dumps({"delta": delta}) + b"\n"
+        result = await finish_answer(plan, "".join(parts).strip())
+        yield orjson.dumps({"result": result}) + b"\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
 
 #########################################################
 ################### Generate Image ######################
 #########################################################
 @app.route("/generate_image", methods=["POST"])
-def generate_image():
+async def generate_image():
     """
     Endpoint for generating images using OpenAI DALL-E.
     Accepts a prompt and returns the generated image URL.
     """
-    data = request.json
+    data = await request.get_json()
     prompt = data.get("prompt", "")
     try:
-        response = openai_client.images.generate(
+        response = await openai_client.images.generate(
             model="dall-e-3",
             prompt=prompt,
             n=1,
@@ -243,31 +719,41 @@ def generate_image():
 ################### Text-to-Speech ######################
 #########################################################
 @app.route("/tts", methods=["POST"])
-def tts():
+async def tts():
     """
     Endpoint for Text-to-Speech (TTS) using OpenAI.
-    Accepts text and voice, returns generated audio as an MP3 file.
+    Accepts text and voice, streams the generated audio as MP3.
     """
-    data = request.json
+    data = await request.get_json()
     text = data.get("text", "")
     voice = data.get("voice", "alloy")  # Default voice
+    # Open the streaming response first, so request errors can still be reported as JSON
+    stack = AsyncExitStack()
     try:
-        response = openai_client.audio.speech.create(
-            model="tts-1",
-            voice=voice,
-            input=text
-        )
-        audio_bytes = response.content
-        return send_file(
-            io.BytesIO(audio_bytes),
-            mimetype="audio/mpeg",
-            as_attachment=False,
-            download_name="speech.mp3"
+        response = await stack.enter_async_context(
+            openai_client.audio.speech.with_streaming_response.create(
+                model="tts-1",
+                voice=voice,
+                input=text
+            )
         )
     except Exception as e:
+        await stack.aclose()
         return jsonify({"error": str(e)}), 500
 
+    # Forward the audio bytes as they arrive instead of buffering the whole file
+    async def generate():
+        async with stack:
+            async for chunk in response.iter_bytes():
+                yield chunk
+
+    return Response(
+        generate(),
+        mimetype="audio/mpeg",
+        headers={"Content-Disposition": "inline; filename=speech.mp3"}
+    )
+
 
 if __name__ == "__main__":
-    # Run the Flask app
+    # Run the Quart app
     app.run(host="0.0.0.0", port=5000, debug=True)
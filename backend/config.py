@@ -10,3 +10,4 @@ OPENAI_CHAT_MODEL = os.getenv("OPENAI_CHAT_MODEL")
 CHROMA_API_KEY = os.getenv("CHROMA_API_KEY")
 CHROMA_TENANT = os.getenv("CHROMA_TENANT")
 CHROMA_DATABASE = os.getenv("CHROMA_DATABASE")
+REDIS_URL = os.getenv("REDIS_URL")
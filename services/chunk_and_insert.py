@@ -1,9 +1,15 @@
-import json
+import argparse
+import orjson
 import os
-from openai import OpenAI
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from openai import OpenAI, RateLimitError
 import chromadb
-from chromadb.utils import embedding_functions
+import numpy as np
 import re
+import tiktoken
 from config import (
     OPENAI_API_KEY,
     OPENAI_EMBEDDING_MODEL,
@@ -12,6 +18,17 @@ from config import (
     CHROMA_DATABASE
 )
 
+#########################################################
+################# Command Line Options ##################
+#########################################################
+parser = argparse.ArgumentParser(description="Chunk book summaries and index them in ChromaDB.")
+parser.add_argument(
+    "--batch-api",
+    action="store_true",
+    help="Embed through the OpenAI Batch API (half the cost, may take up to 24h)"
+)
+args = parser.parse_args()
+
 #########################################################
 #################### Data Loading #######################
 #########################################################
@@ -20,8 +37,8 @@ JSON_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "book_summarie
 COLLECTION_NAME = "book_chunks"
 
 # Load book summaries from JSON file
-with open(JSON_PATH, "r", encoding="utf-8") as f:
-    books = json.load(f)
+with open(JSON_PATH, "rb") as f:
+    books = orjson.loads(f.read())
 
 #########################################################
 ############### Text Chunking Function ##################
@@ -45,12 +62,137 @@ for book in books:
     metadatas.append({"title": book["title"], "themes": ", ".join(book["themes"])})
 
 #########################################################
-############### Embedding Function Setup ################
+################ Batch Embedding Setup ##################
 #########################################################
-embedding_fn = embedding_functions.OpenAIEmbeddingFunction(
-    api_key=OPENAI_API_KEY,
-    model_name=OPENAI_EMBEDDING_MODEL
+# Maximum number of inputs and tokens sent in a single embeddings request
+EMBEDDING_BATCH_SIZE = 256
+MAX_TOKENS_PER_REQUEST = 7000
+# Number of embeddings requests kept in flight at the same time
+EMBEDDING_MAX_WORKERS = 4
+# Retry settings for rate-limited (429) requests
+EMBEDDING_MAX_RETRIES = 5
+EMBEDDING_BACKOFF_SECONDS = 1.0
+
+# Shared HTTP/2 connection pool, sized for the concurrent embedding workers
+_http = httpx.Client(
+    http2=True,
+    timeout=httpx.Timeout(60.0, connect=10.0),
+    limits=httpx.Limits(max_keepalive_connections=20, max_connections=40)
 )
+# SDK retries are disabled: embed_batch is the only retry policy for rate-limited requests
+openai_client = OpenAI(api_key=OPENAI_API_KEY, http_client=_http, max_retries=0)
+
+# Embed one batch, retrying with exponential backoff when rate limited
+def embed_batch(batch):
+    """
+    Returns the embeddings for a single batch of texts.
+    Retries on RateLimitError with exponential backoff and jitter.
+    """
+    for attempt in range(EMBEDDING_MAX_RETRIES):
+        try:
+            response = openai_client.embeddings.create(model=OPENAI_EMBEDDING_MODEL, input=batch)
+            # response.data keeps the order of the input list
+            return [d.embedding for d in response.data]
+        except RateLimitError:
+            if attempt == EMBEDDING_MAX_RETRIES - 1:
+                raise
+            time.sleep(EMBEDDING_BACKOFF_SECONDS * 2 ** attempt + random.uniform(0, 0.5))
+
+# Group consecutive texts into batches that fit in one embeddings request
+def pack_batches(texts):
+    """
+    Returns (start, batch) pairs covering all texts in order.
+    Batches are filled greedily up to MAX_TOKENS_PER_REQUEST tokens and EMBEDDING_BATCH_SIZE inputs.
+    A single text above the token limit is sent on its own.
+    """
+    try:
+        encoding = tiktoken.encoding_for_model(OPENAI_EMBEDDING_MODEL)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    batches = []
+    start = 0
+    batch_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = len(encoding.encode(text))
+        if i > start and (batch_tokens + tokens > MAX_TOKENS_PER_REQUEST or i - start >= EMBEDDING_BATCH_SIZE):
+            batches.append((start, texts[start:i]))
+            start = i
+            batch_tokens = 0
+        batch_tokens += tokens
+    if start < len(texts):
+        batches.append((start, texts[start:]))
+    return batches
+
+# Embed all chunks with as few requests as possible
+def embed_chunks(texts):
+    """
+    Returns one embedding per text, in the same order as the input.
+    Texts are packed into token-aware batches to stay under the request size cap,
+    and the batches are dispatched concurrently by a bounded thread pool.
+    """
+    embeddings = [None] * len(texts)
+    with ThreadPoolExecutor(max_workers=EMBEDDING_MAX_WORKERS) as executor:
+        futures = {}
+        for start, batch in pack_batches(texts):
+            # Small jitter so the requests do not all hit the API at the same instant
+            time.sleep(random.uniform(0, 0.05))
+            futures[start] = executor.submit(embed_batch, batch)
+        for start, future in futures.items():
+            batch_embeddings = future.result()
+            embeddings[start:start + len(batch_embeddings)] = batch_embeddings
+    return embeddings
+
+# Seconds between Batch API status checks
+BATCH_POLL_SECONDS = 30
+
+# Embed all chunks through the OpenAI Batch API
+def embed_chunks_with_batch_api(texts):
+    """
+    Returns one embedding per text, in the same order as the input.
+    Submits all texts as a single Batch API job (cheaper, 24h completion window),
+    waits for it to finish and maps the results back by custom_id.
+    """
+    lines = [
+        orjson.dumps({
+            "custom_id": f"chunk_{i}",
+            "method": "POST",
+            "url": "/v1/embeddings",
+            "body": {"model": OPENAI_EMBEDDING_MODEL, "input": text}
+        })
+        for i, text in enumerate(texts)
+    ]
+    batch_file = openai_client.files.create(
+        file=("embeddings_batch.jsonl", b"\n".join(lines)),
+        purpose="batch"
+    )
+    batch = openai_client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/embeddings",
+        completion_window="24h"
+    )
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        print(f"Batch {batch.id} is {batch.status}, checking again in {BATCH_POLL_SECONDS}s...")
+        time.sleep(BATCH_POLL_SECONDS)
+        batch = openai_client.batches.retrieve(batch.id)
+    if batch.status != "completed" or not batch.output_file_id:
+        raise RuntimeError(f"Embedding batch {batch.id} ended with status {batch.status}")
+    # Output lines are not guaranteed to be in input order
+    by_id = {}
+    for line in openai_client.files.content(batch.output_file_id).text.splitlines():
+        item = orjson.loads(line)
+        if item.get("response") and item["response"]["status_code"] == 200:
+            by_id[item["custom_id"]] = item["response"]["body"]["data"][0]["embedding"]
+    missing = [i for i in range(len(texts)) if f"chunk_{i}" not in by_id]
+    if missing:
+        raise RuntimeError(f"Embedding batch {batch.id} failed for {len(missing)} chunks")
+    return [by_id[f"chunk_{i}"] for i in range(len(texts))]
+
+# Compute embeddings before touching the collection, so it is never left empty while waiting
+# Pass embeddings as one float32 matrix instead of nested Python lists
+if args.batch_api:
+    embeddings = np.asarray(embed_chunks_with_batch_api(chunks), dtype=np.float32)
+else:
+    embeddings = np.asarray(embed_chunks(chunks), dtype=np.float32)
 
 #########################################################
 ############### ChromaDB Cloud Setup ####################
@@ -62,16 +204,15 @@ client = chromadb.CloudClient(
 )
 # Drop and recreate collection to remove old data
 client.delete_collection(name=COLLECTION_NAME)
-collection = client.get_or_create_collection(
-    name=COLLECTION_NAME,
-    embedding_function=embedding_fn
-)
+# Embeddings are supplied explicitly, so no embedding function is attached
+collection = client.get_or_create_collection(name=COLLECTION_NAME)
 
 #########################################################
 ############### Insert Data into ChromaDB ###############
 #########################################################
 collection.add(
     documents=chunks,
+    embeddings=embeddings,
     metadatas=metadatas,
     ids=[f"chunk_{i}" for i in range(len(chunks))]
 )
@@ -0,0 +1,9 @@
+import os
+import sys
+from unittest import mock
+
+# app.py connects to ChromaDB Cloud at import, so replace the client before importing it
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+sys.modules["chromadb"] = mock.MagicMock()
+os.environ.pop("REDIS_URL", None)
+os.environ.setdefault("OPENAI_API_KEY", "test")
@@ -0,0 +1,32 @@
+import pytest
+
+import app
+
+HISTORY = [
+    {"role": "user", "content": "Recommend a book about friendship."},
+    {"role": "assistant", "content": "I recommend The Hobbit."},
+]
+
+
+@pytest.mark.parametrize("question", [
+    "Who wrote it?",
+    "Is the book long?",
+    "tell me more",
+    "what else?",
+    "any other books?",
+    "Do you have something similar with a darker tone and more violence?",
+])
+def test_follow_ups_are_rewritten(question):
+    assert app.needs_rewrite(question, HISTORY)
+
+
+@pytest.mark.parametrize("question", [
+    "Recommend a science fiction novel about a desert planet",
+    "What books do you have about war and survival?",
+])
+def test_fresh_questions_skip_the_rewrite(question):
+    assert not app.needs_rewrite(question, HISTORY)
+
+
+def test_nothing_is_rewritten_without_history():
+    assert not app.needs_rewrite("tell me more", [])
@@ -0,0 +1,16 @@
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize("text", ["tell me more", "hello", "love story"])
+def test_short_text_is_left_to_the_fallback(text):
+    assert app.detect_language_locally(text) is None
+
+
+@pytest.mark.parametrize("text, language", [
+    ("Recommend a book about friendship and magic", "English"),
+    ("Recomandă-mi o carte despre prietenie și aventură", "Romanian"),
+])
+def test_longer_text_is_detected_locally(text, language):
+    assert app.detect_language_locally(text) == language
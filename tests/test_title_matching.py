@@ -0,0 +1,15 @@
+import app
+
+
+def test_title_inside_other_words_is_ignored():
+    text = "I recommend The Alchemist: Santiago crosses the desert dunes on the road to his Personal Legend."
+    assert app.find_mentioned_titles(text) == ["The Alchemist"]
+
+
+def test_titles_are_returned_in_order_of_position():
+    text = "If you liked Dune, try The Hobbit."
+    assert app.find_mentioned_titles(text) == ["Dune", "The Hobbit"]
+
+
+def test_title_must_be_a_whole_word():
+    assert app.find_mentioned_titles("Dunes and The Roadrunner") == []